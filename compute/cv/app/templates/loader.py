@@ -4,13 +4,49 @@ Loads and validates template definitions from JSON files.
 """
 import json
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, NamedTuple, Optional, Tuple
+import numpy as np
 from loguru import logger
 
 from app.schemas.template import Template
 from app.settings import settings
 
 
+class BubbleTable(NamedTuple):
+    """Template bubble positions (question/option order) and registration marks as flat arrays."""
+    xs: np.ndarray            # int32[N]
+    ys: np.ndarray            # int32[N]
+    question_ids: np.ndarray  # int32[N]
+    options: np.ndarray       # str[N]
+    q_offsets: np.ndarray     # int32[Q + 1]; question k owns bubbles q_offsets[k]:q_offsets[k + 1]
+    mark_xs: np.ndarray       # int32[M] registration mark centers
+    mark_ys: np.ndarray       # int32[M]
+    mark_sizes: np.ndarray    # int32[M] mark radius or side length
+
+
+def build_bubble_table(template: Template) -> BubbleTable:
+    """Flatten a template's bubble and registration mark positions into a BubbleTable."""
+    positions = [
+        (q.question_id, option, pos.x, pos.y)
+        for q in template.questions
+        for option, pos in q.options.items()
+    ]
+    counts = [len(q.options) for q in template.questions]
+    
+    question_ids, options, xs, ys = zip(*positions) if positions else ((), (), (), ())
+    marks = template.registration_marks
+    return BubbleTable(
+        xs=np.array(xs, dtype=np.int32),
+        ys=np.array(ys, dtype=np.int32),
+        question_ids=np.array(question_ids, dtype=np.int32),
+        options=np.array(options, dtype=str),
+        q_offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int32),
+        mark_xs=np.array([m.position.x for m in marks], dtype=np.int32),
+        mark_ys=np.array([m.position.y for m in marks], dtype=np.int32),
+        mark_sizes=np.array([m.size for m in marks], dtype=np.int32),
+    )
+
+
 class TemplateLoader:
     """
     Singleton template loader with caching.
@@ -19,6 +55,7 @@ class TemplateLoader:
     
     _instance: Optional["TemplateLoader"] = None
     _cache: Dict[str, Template] = {}
+    _bubble_tables: Dict[str, Tuple[Template, BubbleTable]] = {}
     
     def __new__(cls):
         if cls._instance is None:
@@ -87,6 +124,25 @@ class TemplateLoader:
         
         return template
     
+    def bubble_table(self, template: Template) -> BubbleTable:
+        """
+        Get the flattened bubble table for a template, built once per template object.
+        
+        Args:
+            template: Loaded template
+            
+        Returns:
+            BubbleTable with per-bubble positions, question IDs and options,
+            plus registration mark centers and sizes
+        """
+        cached = self._bubble_tables.get(template.template_id)
+        if cached is not None and cached[0] is template:
+            return cached[1]
+        
+        table = build_bubble_table(template)
+        self._bubble_tables[template.template_id] = (template, table)
+        return table
+    
     def list_available(self) -> list[str]:
         """List all available template IDs."""
         if not self.templates_dir.exists():
@@ -104,6 +160,7 @@ class TemplateLoader:
     def clear_cache(self):
         """Clear template cache (useful for hot-reloading during development)."""
         self._cache.clear()
+        self._bubble_tables.clear()
         logger.info("Template cache cleared")
 
 
@@ -119,3 +176,13 @@ def load_template(template_id: str) -> Template:
         template = load_template("form_A")
     """
     return template_loader.load(template_id)
+
+
+def get_bubble_table(template: Template) -> BubbleTable:
+    """
+    Convenience function to get a template's flattened bubble table.
+    
+    Usage:
+        table = get_bubble_table(load_template("form_A"))
+    """
+    return template_loader.bubble_table(template)
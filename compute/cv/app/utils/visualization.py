@@ -189,19 +189,26 @@ def create_pipeline_stages_grid(
     max_h = max(img.shape[0] for _, img in stages)
     max_w = max(img.shape[1] for _, img in stages)
     
-    # Resize all to same size
-    resized_stages = []
-    for name, img in stages:
+    # Preallocate the grid; unused cells stay black
+    grid = np.zeros((grid_rows * max_h, grid_cols * max_w, 3), dtype=np.uint8)
+    
+    for i, (name, img) in enumerate(stages):
+        row, col = divmod(i, grid_cols)
+        cell = grid[row * max_h:(row + 1) * max_h, col * max_w:(col + 1) * max_w]
+        
         # Convert to BGR if grayscale
         if len(img.shape) == 2:
             img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
         
-        # Resize
-        img_resized = cv2.resize(img, (max_w, max_h))
+        # Resize straight into the grid cell
+        if img.shape[:2] == (max_h, max_w):
+            cell[...] = img
+        else:
+            cv2.resize(img, (max_w, max_h), dst=cell)
         
         # Add title
         cv2.putText(
-            img_resized,
+            cell,
             name,
             (10, 30),
             cv2.FONT_HERSHEY_SIMPLEX,
@@ -209,20 +216,6 @@ def create_pipeline_stages_grid(
             (0, 255, 255),
             2
         )
-        
-        resized_stages.append(img_resized)
-    
-    # Pad if needed
-    while len(resized_stages) < grid_rows * grid_cols:
-        resized_stages.append(np.zeros((max_h, max_w, 3), dtype=np.uint8))
-    
-    # Create grid
-    rows = []
-    for i in range(grid_rows):
-        row_images = resized_stages[i * grid_cols:(i + 1) * grid_cols]
-        rows.append(np.hstack(row_images))
-    
-    grid = np.vstack(rows)
     
     return grid
 
@@ -31,6 +31,7 @@ Example:
 import argparse
 import sys
 import json
+from collections import defaultdict
 from pathlib import Path
 from typing import Dict, List, Tuple, Any
 from dataclasses import dataclass, asdict
@@ -96,6 +97,7 @@ class ImageAccuracy:
     warnings: List[str]
     errors: List[str]
     question_details: List[QuestionAccuracy]
+    condition: str = ""
 
 
 @dataclass
@@ -123,6 +125,16 @@ class AccuracyBenchmark:
         self.answer_key = self._load_answer_key(answer_key_path)
         self.results: List[ImageAccuracy] = []
         self.save_debug_images = save_debug_images
+        
+        # Running totals, updated as each image result is recorded
+        self._totals = {
+            "questions": 0,
+            "correct": 0,
+            "conf_weighted": 0.0,
+            "perfect": 0,
+            "failed": 0,
+            "review": 0
+        }
     
     def _load_answer_key(self, path: str = None) -> Dict[int, str]:
         """
@@ -148,6 +160,10 @@ class AccuracyBenchmark:
         """Benchmark a single image."""
         logger.info(f"Benchmarking: {image_path.name}")
         
+        # Extract condition from filename once (e.g., "test_blurry_form_A.png" -> "blurry")
+        stem = image_path.stem
+        condition = stem.split("_")[1] if "_" in stem else "unknown"
+        
         # Run pipeline
         try:
             result = run_detection_pipeline(
@@ -158,7 +174,7 @@ class AccuracyBenchmark:
             )
         except Exception as e:
             logger.error(f"  Pipeline failed: {e}")
-            return self._create_failed_result(image_path.name, str(e))
+            return self._create_failed_result(image_path.name, str(e), condition)
         
         # Save debug visualization if requested
         if self.save_debug_images:
@@ -222,7 +238,8 @@ class AccuracyBenchmark:
             quality_metrics=_to_jsonable(result.quality_metrics),
             warnings=[str(w) for w in result.warnings],
             errors=[str(e) for e in result.errors],
-            question_details=question_details
+            question_details=question_details,
+            condition=condition
         )
         
         logger.info(f"  Accuracy: {accuracy:.1f}% ({correct}/{total})")
@@ -233,7 +250,7 @@ class AccuracyBenchmark:
     def _save_debug_visualization(self, image_path: Path, result):
         """Save visualization showing detected circles and ROI extraction."""
         import cv2
-        from app.templates.loader import load_template
+        from app.templates.loader import get_bubble_table, load_template
         from app.pipeline.align import align_image_with_template
         from app.pipeline.preprocess import preprocess_image
         from app.pipeline.paper_detection import detect_paper_boundary
@@ -288,14 +305,16 @@ class AccuracyBenchmark:
                 logger.warning(f"  Alignment error in debug visualization: {e}")
                 aligned = corrected
             
-            # Convert to BGR for drawing
+            # Convert to BGR for drawing; a color image is local to this call,
+            # so it is drawn on in place rather than copied
             if len(aligned.shape) == 2:
                 vis_img = cv2.cvtColor(aligned, cv2.COLOR_GRAY2BGR)
             else:
-                vis_img = aligned.copy()
+                vis_img = aligned
             
-            # Extract expected mark positions from template
-            expected_marks = [(mark.position.x, mark.position.y) for mark in template.registration_marks]
+            # Expected mark positions (from the loader's cached template table)
+            table = get_bubble_table(template)
+            expected_marks = list(zip(table.mark_xs.tolist(), table.mark_ys.tolist()))
             
             # Draw expected marks (blue squares with labels)
             for i, (x, y) in enumerate(expected_marks):
@@ -391,7 +410,7 @@ class AccuracyBenchmark:
             import traceback
             logger.debug(traceback.format_exc())
     
-    def _create_failed_result(self, image_name: str, error: str) -> ImageAccuracy:
+    def _create_failed_result(self, image_name: str, error: str, condition: str = "unknown") -> ImageAccuracy:
         """Create result for failed pipeline."""
         return ImageAccuracy(
             image_name=image_name,
@@ -407,7 +426,8 @@ class AccuracyBenchmark:
             quality_metrics={},
             warnings=[],
             errors=[str(error)],
-            question_details=[]
+            question_details=[],
+            condition=condition
         )
     
     def benchmark_directory(self, test_dir: Path) -> BenchmarkReport:
@@ -427,34 +447,46 @@ class AccuracyBenchmark:
         
         # Benchmark each image
         for image_path in sorted(image_files):
-            result = self.benchmark_image(image_path)
-            self.results.append(result)
+            self._record_result(self.benchmark_image(image_path))
         
         # Generate report
         report = self._generate_report()
         return report
     
+    def _record_result(self, result: ImageAccuracy):
+        """Store an image result and update the running totals."""
+        self.results.append(result)
+        
+        totals = self._totals
+        totals["questions"] += result.total_questions
+        totals["correct"] += result.correct_detections
+        if result.total_questions > 0:
+            totals["conf_weighted"] += result.average_confidence * result.total_questions
+        
+        # Count by status
+        if result.accuracy_rate == 100.0:
+            totals["perfect"] += 1
+        if result.pipeline_status == "failed":
+            totals["failed"] += 1
+        elif result.pipeline_status == "needs_review":
+            totals["review"] += 1
+    
     def _generate_report(self) -> BenchmarkReport:
         """Generate comprehensive benchmark report."""
         if not self.results:
             return self._create_empty_report()
         
+        totals = self._totals
         total_images = len(self.results)
-        total_questions = sum(r.total_questions for r in self.results)
-        total_correct = sum(r.correct_detections for r in self.results)
+        total_questions = totals["questions"]
+        total_correct = totals["correct"]
         
         overall_accuracy = (total_correct / total_questions * 100) if total_questions > 0 else 0.0
+        average_confidence = (totals["conf_weighted"] / total_questions) if total_questions > 0 else 0.0
         
-        total_confidence = sum(
-            r.average_confidence * r.total_questions 
-            for r in self.results if r.total_questions > 0
-        )
-        average_confidence = (total_confidence / total_questions) if total_questions > 0 else 0.0
-        
-        # Count by status
-        perfect_scans = sum(1 for r in self.results if r.accuracy_rate == 100.0)
-        failed_scans = sum(1 for r in self.results if r.pipeline_status == "failed")
-        needs_review = sum(1 for r in self.results if r.pipeline_status == "needs_review")
+        perfect_scans = totals["perfect"]
+        failed_scans = totals["failed"]
+        needs_review = totals["review"]
         
         # Condition breakdown (from image names)
         condition_breakdown = self._analyze_by_condition()
@@ -480,9 +512,7 @@ class AccuracyBenchmark:
         conditions = {}
         
         for result in self.results:
-            # Extract condition from filename (e.g., "test_blurry_form_A.png" -> "blurry")
-            parts = result.image_name.replace(".png", "").replace(".jpg", "").split("_")
-            condition = parts[1] if len(parts) > 1 else "unknown"
+            condition = result.condition or "unknown"
             
             if condition not in conditions:
                 conditions[condition] = {
@@ -507,22 +537,14 @@ class AccuracyBenchmark:
     
     def _build_confusion_matrix(self) -> Dict[str, Dict[str, int]]:
         """Build confusion matrix showing expected vs detected answers."""
-        matrix = {}
+        matrix = defaultdict(lambda: defaultdict(int))
         
         for result in self.results:
             for question in result.question_details:
-                expected = question.expected
-                detected = question.detected
-                
-                if expected not in matrix:
-                    matrix[expected] = {}
-                
-                if detected not in matrix[expected]:
-                    matrix[expected][detected] = 0
-                
-                matrix[expected][detected] += 1
+                matrix[question.expected][question.detected] += 1
         
-        return matrix
+        # Plain dicts for JSON serialization
+        return {expected: dict(row) for expected, row in matrix.items()}
     
     def _create_empty_report(self) -> BenchmarkReport:
         """Create empty report."""
@@ -144,8 +144,7 @@ def debug_bubble_detection(image_path: str, template_id: str, question_ids: list
                        f"({'FILLED' if fill_ratio >= template.bubble_config.fill_threshold else 'EMPTY'})")
         
         # Determine selection
-        sorted_fills = sorted(fill_ratios.items(), key=lambda x: x[1], reverse=True)
-        top_option, top_ratio = sorted_fills[0]
+        top_option, top_ratio = max(fill_ratios.items(), key=lambda x: x[1])
         
         if top_ratio >= template.bubble_config.fill_threshold:
             logger.info(f"  → DETECTED: {top_option} (ratio={top_ratio:.3f})")
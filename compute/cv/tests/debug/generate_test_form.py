@@ -35,10 +35,12 @@ Example:
 
 """
 import argparse
+import os
 import sys
-import random
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 import cv2
 import numpy as np
 from loguru import logger
@@ -49,16 +51,46 @@ sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 from app.templates.loader import load_template
 from app.schemas.template import Template
 
+# Read-only base forms shared by generators, keyed by (template_id, width, height)
+_BASE_FORM_CACHE: Dict[Tuple[str, int, int], np.ndarray] = {}
+
 
 class TestFormGenerator:
     """Generates synthetic test forms with various conditions."""
     
-    def __init__(self, template_id: str, output_dir: str):
+    def __init__(self, template_id: str, output_dir: str, seed: Optional[int] = None):
         self.template_id = template_id
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.template = load_template(template_id)
         
+        # Root entropy for per-condition generators (noise, erasures)
+        self._entropy = np.random.SeedSequence(seed).entropy
+        
+        # Flat bubble/label geometry (the template never changes)
+        questions = self.template.questions
+        self._questions_by_id = {q.question_id: q for q in questions}
+        first_positions = [next(iter(q.options.values())) for q in questions]
+        self._qnum_labels = [str(q.question_id) for q in questions]
+        self._qnum_positions = np.array(
+            [[pos.x - 60, pos.y + 5] for pos in first_positions],
+            dtype=np.int32
+        )
+        self._option_labels = [option_id for q in questions for option_id in q.options]
+        self._bubble_xy = np.array(
+            [[pos.x, pos.y] for q in questions for pos in q.options.values()],
+            dtype=np.int32
+        )
+        
+        # Blank form with header, marks and bubbles; built on first use
+        self._base_form: Optional[np.ndarray] = None
+        
+        # 256-entry intensity tables keyed by condition
+        self._luts: Dict[str, np.ndarray] = {}
+        
+        # Shadow gradients keyed by image shape
+        self._shadow_gradients: Dict[Tuple, np.ndarray] = {}
+        
     def generate_all_conditions(self, answers: Dict[int, str] = None) -> List[Path]:
         """Generate forms with all standard test conditions."""
         conditions = [
@@ -79,14 +111,21 @@ class TestFormGenerator:
             "multiple_marks",
             "erased_marks"
         ]
+        return self.generate_conditions(conditions, answers)
+    
+    def generate_conditions(self, conditions: List[str],
+                            answers: Dict[int, str] = None) -> List[Path]:
+        """Generate one form per condition, encoding and writing on worker threads."""
+        # Build the shared base form before fanning out; workers only copy it
+        self._get_base_form()
         
-        generated = []
-        for condition in conditions:
+        def _generate(condition: str) -> Path:
             logger.info(f"Generating: {condition}")
-            path = self.generate_form(condition, answers)
-            generated.append(path)
+            return self.generate_form(condition, answers)
         
-        return generated
+        # Conditions are independent and the OpenCV work releases the GIL
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            return list(executor.map(_generate, conditions))
     
     def generate_form(self, condition: str, answers: Dict[int, str] = None) -> Path:
         """
@@ -96,23 +135,20 @@ class TestFormGenerator:
             condition: Type of degradation/variation
             answers: Dict mapping question_id to option (e.g., {1: 'A', 2: 'B'})
         """
-        # Create blank form
-        form = self._create_blank_form()
-        
-        # Add registration marks
-        form = self._add_registration_marks(form)
-        
-        # Add question numbers and bubbles
-        form = self._add_questions_and_bubbles(form)
+        # Start from the cached base form (identical for every condition)
+        form = self._get_base_form().copy()
+        rng = self._condition_rng(condition)
         
         # Fill answers if provided
         if answers:
-            form = self._fill_answers(form, answers, condition)
+            form = self._fill_answers(form, answers, condition, rng)
         
         # Apply degradation/transformation
-        form = self._apply_condition(form, condition)
+        form = self._apply_condition(form, condition, rng)
         
-        # Save
+        # Save. OpenCV's PNG defaults are already its speed-tuned path
+        # (zlib level 1, SUB filter, RLE strategy); passing an explicit
+        # compression level switches to slower adaptive filtering.
         filename = f"test_{condition}_{self.template_id}.png"
         output_path = self.output_dir / filename
         cv2.imwrite(str(output_path), form)
@@ -120,13 +156,40 @@ class TestFormGenerator:
         logger.info(f"  Saved: {filename}")
         return output_path
     
+    def _condition_rng(self, condition: str) -> np.random.Generator:
+        """Independent generator per condition, stable across runs and threads."""
+        return np.random.default_rng([self._entropy, zlib.crc32(condition.encode())])
+    
+    def _get_base_form(self) -> np.ndarray:
+        """Return the blank form with marks and bubbles, building it once."""
+        if self._base_form is None:
+            size = self.template.canonical_size
+            key = (self.template_id, size.width, size.height)
+            form = _BASE_FORM_CACHE.get(key)
+            if form is None:
+                # Create blank form
+                form = self._create_blank_form()
+                
+                # Add registration marks
+                form = self._add_registration_marks(form)
+                
+                # Add question numbers and bubbles
+                form = self._add_questions_and_bubbles(form)
+                
+                # Shared prototype; callers work on copies
+                form.flags.writeable = False
+                _BASE_FORM_CACHE[key] = form
+            self._base_form = form
+        
+        return self._base_form
+    
     def _create_blank_form(self) -> np.ndarray:
         """Create blank white form at canonical size."""
         width = self.template.canonical_size.width
         height = self.template.canonical_size.height
         
         # Create white background
-        form = np.ones((height, width), dtype=np.uint8) * 255
+        form = np.full((height, width), 255, dtype=np.uint8)
         
         # Don't draw border - it interferes with corner registration marks
         # If border is needed, it should be drawn AFTER marks or much further in
@@ -212,45 +275,36 @@ class TestFormGenerator:
         """Draw question numbers and bubble outlines."""
         radius = self.template.bubble_config.radius
         
-        for question in self.template.questions:
-            # options is Dict[str, Position]
-            first_key, first_pos = next(iter(question.options.items()))
-            qnum_x = first_pos.x - 60
-            qnum_y = first_pos.y + 5
-            
-            cv2.putText(form, str(question.question_id), 
+        # Question numbers left of each question's first option
+        for label, (qnum_x, qnum_y) in zip(self._qnum_labels, self._qnum_positions.tolist()):
+            cv2.putText(form, label, 
                        (qnum_x, qnum_y),
                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, 0, 1)
-            
-            # Draw bubble circles for each option
-            for option_id, pos in question.options.items():
-                # Outer circle
-                cv2.circle(form, (pos.x, pos.y), radius, 0, 2)
-                
-                # Option label above bubble
-                label_x = pos.x - 8
-                label_y = pos.y - radius - 10
-                cv2.putText(form, option_id,
-                           (label_x, label_y),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.4, 0, 1)
+        
+        # Bubble circles with the option label above each one
+        for option_id, (x, y) in zip(self._option_labels, self._bubble_xy.tolist()):
+            cv2.circle(form, (x, y), radius, 0, 2)
+            cv2.putText(form, option_id,
+                       (x - 8, y - radius - 10),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.4, 0, 1)
         
         return form
     
     def _fill_answers(self, form: np.ndarray, answers: Dict[int, str], 
-                     condition: str) -> np.ndarray:
+                     condition: str, rng: np.random.Generator) -> np.ndarray:
         """
         Fill bubbles according to answers.
         
         Args:
             answers: Dict mapping question_id to option_id
             condition: Affects how marks are drawn
+            rng: Generator for random eraser marks
         """
         radius = self.template.bubble_config.radius
         
         for question_id, option_id in answers.items():
             # Find the question and option
-            question = next((q for q in self.template.questions 
-                           if q.question_id == question_id), None)
+            question = self._questions_by_id.get(question_id)
             if not question:
                 continue
             
@@ -275,11 +329,10 @@ class TestFormGenerator:
             elif "erased_marks" in condition:
                 # Draw fill with some white patches
                 self._draw_bubble_fill(form, pos.x, pos.y, radius)
-                # Add eraser marks
-                for _ in range(3):
-                    ex = pos.x + np.random.randint(-radius//2, radius//2)
-                    ey = pos.y + np.random.randint(-radius//2, radius//2)
-                    cv2.circle(form, (ex, ey), radius//3, 255, -1)
+                # Add eraser marks (all offsets drawn in one call)
+                offsets = rng.integers(-radius//2, radius//2, size=(3, 2))
+                for ex_off, ey_off in offsets.tolist():
+                    cv2.circle(form, (pos.x + ex_off, pos.y + ey_off), radius//3, 255, -1)
             else:
                 # Normal fill
                 self._draw_bubble_fill(form, pos.x, pos.y, radius)
@@ -293,7 +346,8 @@ class TestFormGenerator:
         color = int(255 * (1 - intensity))  # 0=black, 255=white
         cv2.circle(form, (x, y), radius - 3, color, -1)
     
-    def _apply_condition(self, form: np.ndarray, condition: str) -> np.ndarray:
+    def _apply_condition(self, form: np.ndarray, condition: str,
+                         rng: np.random.Generator) -> np.ndarray:
         """Apply degradation/transformation based on condition."""
         
         if condition == "perfect":
@@ -316,25 +370,30 @@ class TestFormGenerator:
         
         elif condition == "low_contrast":
             # Reduce contrast
-            return cv2.convertScaleAbs(form, alpha=0.5, beta=128)
+            return cv2.LUT(form, self._intensity_lut(condition, alpha=0.5, beta=128))
         
         elif condition == "dark":
             # Make darker
-            return cv2.convertScaleAbs(form, alpha=1.0, beta=-60)
+            return cv2.LUT(form, self._intensity_lut(condition, alpha=1.0, beta=-60))
         
         elif condition == "bright":
             # Make brighter
-            return cv2.convertScaleAbs(form, alpha=1.0, beta=40)
+            return cv2.LUT(form, self._intensity_lut(condition, alpha=1.0, beta=40))
         
         elif condition == "noisy":
-            # Add Gaussian noise
-            noise = np.random.normal(0, 15, form.shape).astype(np.int16)
-            noisy = np.clip(form.astype(np.int16) + noise, 0, 255)
-            return noisy.astype(np.uint8)
+            # Add Gaussian noise (saturating uint8 add in a single pass)
+            noise = rng.standard_normal(form.shape, dtype=np.float32)
+            noise *= 15.0
+            np.rint(noise, out=noise)
+            np.clip(noise, -128, 127, out=noise)
+            return cv2.add(form, noise.astype(np.int8), dtype=cv2.CV_8U)
         
         elif condition == "shadow":
-            # Add gradient shadow
-            shadow = self._create_shadow_gradient(form.shape)
+            # Add gradient shadow (depends only on the shape, so reuse it)
+            shadow = self._shadow_gradients.get(form.shape)
+            if shadow is None:
+                shadow = self._create_shadow_gradient(form.shape)
+                self._shadow_gradients[form.shape] = shadow
             return cv2.addWeighted(form, 0.7, shadow, 0.3, 0)
         
         elif "perspective" in condition:
@@ -345,6 +404,15 @@ class TestFormGenerator:
         
         return form
     
+    def _intensity_lut(self, condition: str, alpha: float, beta: float) -> np.ndarray:
+        """Lookup table matching cv2.convertScaleAbs(x, alpha, beta) for uint8 input."""
+        lut = self._luts.get(condition)
+        if lut is None:
+            values = np.abs(np.arange(256, dtype=np.float64) * alpha + beta)
+            lut = np.clip(np.rint(values), 0, 255).astype(np.uint8)
+            self._luts[condition] = lut
+        return lut
+    
     def _apply_rotation(self, image: np.ndarray, angle: float) -> np.ndarray:
         """Rotate image by angle."""
         h, w = image.shape[:2]
@@ -359,13 +427,13 @@ class TestFormGenerator:
     def _create_shadow_gradient(self, shape: Tuple[int, int]) -> np.ndarray:
         """Create a shadow gradient image."""
         h, w = shape
-        gradient = np.zeros((h, w), dtype=np.uint8)
         
-        for y in range(h):
-            intensity = int(100 + (155 * y / h))
-            gradient[y, :] = intensity
+        # Per-row intensity column, broadcast across the width
+        ys = np.arange(h, dtype=np.float64)
+        column = (100 + 155 * ys / h).astype(np.uint8)[:, None]
         
-        return gradient
+        # cv2.addWeighted needs a contiguous buffer, not a broadcast view
+        return np.ascontiguousarray(np.broadcast_to(column, (h, w)))
     
     def _apply_perspective(self, image: np.ndarray, direction: str) -> np.ndarray:
         """Apply perspective transformation."""
@@ -450,19 +518,32 @@ def main():
             sys.exit(1)
     
     # Initialize generator to access template
-    generator = TestFormGenerator(args.template, args.output)
+    generator = TestFormGenerator(args.template, args.output, seed=args.seed)
     
     # Generate random answers if requested and not provided explicitly
     if args.random_answers and not answers:
-        if args.seed is not None:
-            random.seed(args.seed)
-        # Build a random answer for each question from available option keys
-        answers = {}
+        rng = np.random.default_rng(args.seed)
+        
+        # Group questions by their option keys (usually all A/B/C/D)
+        groups: Dict[Tuple[str, ...], List[int]] = {}
         for q in generator.template.questions:
-            opts = list(q.options.keys())
+            opts = tuple(q.options.keys())
             if not opts:
                 continue
-            answers[q.question_id] = random.choice(opts)
+            groups.setdefault(opts, []).append(q.question_id)
+        
+        # One vectorized draw per option group
+        chosen = {}
+        for opts, qids in groups.items():
+            idx = rng.integers(0, len(opts), size=len(qids))
+            chosen.update(zip(qids, np.array(opts)[idx].tolist()))
+        
+        # Keep template question order in the answer key
+        answers = {
+            q.question_id: chosen[q.question_id]
+            for q in generator.template.questions
+            if q.question_id in chosen
+        }
         logger.info(f"Generated random answers for {len(answers)} questions")
         # Optionally save the generated answer key
         if args.save_answer_key:
@@ -480,10 +561,9 @@ def main():
     else:
         conditions = args.conditions.split(",")
         logger.info(f"Generating {len(conditions)} conditions...")
-        generated = []
-        for condition in conditions:
-            path = generator.generate_form(condition.strip(), answers)
-            generated.append(path)
+        generated = generator.generate_conditions(
+            [condition.strip() for condition in conditions], answers
+        )
         logger.success(f"✅ Generated {len(generated)} test forms")
     
     logger.info(f"Output directory: {args.output}")
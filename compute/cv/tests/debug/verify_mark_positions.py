@@ -9,6 +9,7 @@ Example Usage:
 python -m tests.debug.verify_mark_positions --image tests/fixtures/images/test_perfect_form_60q.png --template form_60q
 
 """
+import math
 import sys
 from pathlib import Path
 import cv2
@@ -20,43 +21,35 @@ sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 from app.templates.loader import load_template
 
 
-def find_mark_center(image: np.ndarray, expected_x: int, expected_y: int, 
+def find_mark_center(binary: np.ndarray, expected_x: int, expected_y: int, 
                      search_radius: int = 100) -> tuple:
-    """Find the actual center of a registration mark."""
-    # Extract region around expected position
+    """Find the actual center of a registration mark in an inverted binary image."""
+    # Extract region around expected position (a view, no copy)
     x1 = max(0, expected_x - search_radius)
     y1 = max(0, expected_y - search_radius)
-    x2 = min(image.shape[1], expected_x + search_radius)
-    y2 = min(image.shape[0], expected_y + search_radius)
+    x2 = min(binary.shape[1], expected_x + search_radius)
+    y2 = min(binary.shape[0], expected_y + search_radius)
     
-    roi = image[y1:y2, x1:x2]
+    roi = binary[y1:y2, x1:x2]
     
-    # Threshold to find black marks
-    _, binary = cv2.threshold(roi, 127, 255, cv2.THRESH_BINARY_INV)
+    # Label connected blobs; areas and centroids come back as arrays
+    n_labels, _, stats, centroids = cv2.connectedComponentsWithStats(
+        roi, connectivity=8, ltype=cv2.CV_32S
+    )
     
-    # Find contours
-    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
-    if not contours:
+    if n_labels < 2:
         return None
     
-    # Find largest contour (should be the mark)
-    largest = max(contours, key=cv2.contourArea)
-    
-    # Get moments to find centroid
-    M = cv2.moments(largest)
-    if M['m00'] == 0:
-        return None
-    
-    cx = int(M['m10'] / M['m00'])
-    cy = int(M['m01'] / M['m00'])
+    # Largest blob (should be the mark), skipping label 0 (background)
+    idx = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+    cx, cy = centroids[idx]
     
     # Convert back to image coordinates
-    actual_x = x1 + cx
-    actual_y = y1 + cy
+    actual_x = x1 + int(cx)
+    actual_y = y1 + int(cy)
     
     # Also get bounding box
-    x, y, w, h = cv2.boundingRect(largest)
+    x, y, w, h = (int(v) for v in stats[idx, :4])
     bbox = (x1 + x, y1 + y, w, h)
     
     return (actual_x, actual_y, bbox)
@@ -80,11 +73,14 @@ def verify_marks(image_path: str, template_id: str):
     print("REGISTRATION MARK VERIFICATION")
     print("="*80)
     
+    # Threshold once to find black marks; each mark search reads a window
+    _, binary = cv2.threshold(image, 127, 255, cv2.THRESH_BINARY_INV)
+    
     for mark in template.registration_marks:
         expected_x = mark.position.x
         expected_y = mark.position.y
         
-        result = find_mark_center(image, expected_x, expected_y)
+        result = find_mark_center(binary, expected_x, expected_y)
         
         if result:
             actual_x, actual_y, bbox = result
@@ -92,7 +88,7 @@ def verify_marks(image_path: str, template_id: str):
             
             offset_x = actual_x - expected_x
             offset_y = actual_y - expected_y
-            distance = np.sqrt(offset_x**2 + offset_y**2)
+            distance = math.hypot(offset_x, offset_y)
             
             print(f"\n{mark.id.upper()}:")
             print(f"  Type: {mark.type}, Size: {mark.size}")
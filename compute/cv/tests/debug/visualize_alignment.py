@@ -19,7 +19,10 @@ Example:
 """
 import argparse
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+from typing import Optional
 import cv2
 import numpy as np
 from loguru import logger
@@ -27,29 +30,41 @@ from loguru import logger
 # Add parent directories to path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from app.templates.loader import load_template
+from app.templates.loader import get_bubble_table, load_template
 from app.pipeline.preprocess import preprocess_image
 from app.pipeline.paper_detection import detect_paper_boundary
 from app.pipeline.perspective import correct_perspective
 from app.pipeline.align import detect_registration_marks, align_image_with_template
 
 
-def draw_paper_boundary(image: np.ndarray, boundary: np.ndarray) -> np.ndarray:
-    """Draw detected paper boundary on image."""
-    vis = image.copy()
-    if len(vis.shape) == 2:
-        vis = cv2.cvtColor(vis, cv2.COLOR_GRAY2BGR)
+def _draw_target(image: np.ndarray, out: Optional[np.ndarray]) -> np.ndarray:
+    """Buffer to draw on: a copy of image, or out holding image (out may be image itself)."""
+    if out is None:
+        return image.copy()
+    if out is not image:
+        np.copyto(out, image)
+    return out
+
+
+def draw_paper_boundary(
+    image: np.ndarray,
+    boundary: np.ndarray,
+    out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Draw detected paper boundary on a BGR image (into out if given)."""
+    vis = _draw_target(image, out)
     
     # Draw boundary polygon
-    pts = boundary.reshape((-1, 1, 2)).astype(np.int32)
-    cv2.polylines(vis, [pts], True, (0, 255, 0), 3)
+    corners = boundary.reshape(-1, 2).astype(np.int32)
+    cv2.polylines(vis, [corners.reshape(-1, 1, 2)], True, (0, 255, 0), 3)
     
-    # Draw corner points
-    for i, (x, y) in enumerate(boundary):
-        cv2.circle(vis, (int(x), int(y)), 10, (0, 0, 255), -1)
+    # Draw corner points, labels offset up and to the right
+    label_positions = corners + np.array([15, -15], dtype=np.int32)
+    for i, (corner, label_pos) in enumerate(zip(corners.tolist(), label_positions.tolist())):
+        cv2.circle(vis, corner, 10, (0, 0, 255), -1)
         cv2.putText(
             vis, f"C{i+1}",
-            (int(x) + 15, int(y) - 15),
+            label_pos,
             cv2.FONT_HERSHEY_SIMPLEX,
             0.8, (0, 0, 255), 2
         )
@@ -60,49 +75,55 @@ def draw_paper_boundary(image: np.ndarray, boundary: np.ndarray) -> np.ndarray:
 def draw_registration_marks_detailed(
     image: np.ndarray,
     template,
-    detected_marks=None
+    detected_marks=None,
+    out: Optional[np.ndarray] = None
 ) -> np.ndarray:
-    """Draw registration marks with search areas."""
-    vis = image.copy()
-    if len(vis.shape) == 2:
-        vis = cv2.cvtColor(vis, cv2.COLOR_GRAY2BGR)
+    """Draw registration marks with search areas on a BGR image (into out if given)."""
+    vis = _draw_target(image, out)
     
+    font = cv2.FONT_HERSHEY_SIMPLEX
     img_height = vis.shape[0]
     img_center_y = img_height / 2
     
-    for i, mark in enumerate(template.registration_marks):
-        x, y = mark.position.x, mark.position.y
-        
-        # Calculate adaptive search radius
-        distance_from_center_y = abs(y - img_center_y)
-        radius_multiplier = 1.0 + (distance_from_center_y / img_center_y) * 1.0
-        search_radius = int(50 * radius_multiplier)
-        
-        # Draw search area (light blue rectangle)
-        cv2.rectangle(
-            vis,
-            (x - search_radius, y - search_radius),
-            (x + search_radius, y + search_radius),
-            (255, 200, 100), 2
-        )
-        
-        # Draw expected position
+    # Adaptive search radius for all marks at once (grows away from center)
+    table = get_bubble_table(template)
+    positions = np.stack([table.mark_xs, table.mark_ys], axis=1)
+    distance_from_center_y = np.abs(positions[:, 1] - img_center_y)
+    search_radii = (50 * (1.0 + distance_from_center_y / img_center_y)).astype(np.int32)
+    
+    # Corner offsets (tl, tr, br, bl) of a unit box, scaled per mark below
+    box = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]], dtype=np.int32)
+    
+    # Draw all search areas (light blue rectangles) in one call
+    search_areas = positions[:, None, :] + box * search_radii[:, None, None]
+    cv2.polylines(vis, list(search_areas), True, (255, 200, 100), 2)
+    
+    # Draw expected square marks in one call; circles are drawn per mark below
+    is_square = np.array([mark.type == "square" for mark in template.registration_marks], dtype=bool)
+    if is_square.any():
+        half_sizes = table.mark_sizes[is_square] // 2
+        squares = positions[is_square][:, None, :] + box * half_sizes[:, None, None]
+        cv2.polylines(vis, list(squares), True, (255, 0, 0), 2)
+    
+    # Offsets of detected marks from their expected positions, in one pass
+    detected_marks = detected_marks or []
+    n_detected = min(len(detected_marks), len(positions))
+    detected = np.asarray(detected_marks[:n_detected], dtype=np.float64).reshape(-1, 2)
+    offsets = np.linalg.norm(detected - positions[:n_detected], axis=1).tolist()
+    
+    sizes = table.mark_sizes.tolist()
+    for i, (mark, (x, y), size, search_radius) in enumerate(
+        zip(template.registration_marks, positions.tolist(), sizes, search_radii.tolist())
+    ):
+        # Draw expected circle mark
         if mark.type == "circle":
-            cv2.circle(vis, (x, y), mark.size, (255, 0, 0), 2)
-        else:  # square
-            half_size = mark.size // 2
-            cv2.rectangle(
-                vis,
-                (x - half_size, y - half_size),
-                (x + half_size, y + half_size),
-                (255, 0, 0), 2
-            )
+            cv2.circle(vis, (x, y), size, (255, 0, 0), 2)
         
         # Label expected
         cv2.putText(
-            vis, f"{mark.id}",
+            vis, mark.id,
             (x - 60, y - search_radius - 10),
-            cv2.FONT_HERSHEY_SIMPLEX,
+            font,
             0.6, (255, 0, 0), 2
         )
         
@@ -110,54 +131,77 @@ def draw_registration_marks_detailed(
         cv2.putText(
             vis, f"R={search_radius}px",
             (x + search_radius + 5, y),
-            cv2.FONT_HERSHEY_SIMPLEX,
+            font,
             0.4, (255, 200, 100), 1
         )
         
         # Draw detected position if available
-        if detected_marks and i < len(detected_marks):
+        if i < n_detected:
             det_x, det_y = detected_marks[i]
             
             # Draw detected mark (green)
-            cv2.circle(vis, (det_x, det_y), mark.size + 5, (0, 255, 0), 2)
+            cv2.circle(vis, (det_x, det_y), size + 5, (0, 255, 0), 2)
             
             # Draw line from expected to detected
             cv2.line(vis, (x, y), (det_x, det_y), (0, 255, 255), 1)
             
-            # Calculate and show offset
-            offset = np.sqrt((det_x - x)**2 + (det_y - y)**2)
+            # Show offset
             cv2.putText(
-                vis, f"Δ={offset:.1f}px",
+                vis, f"Δ={offsets[i]:.1f}px",
                 (det_x + 10, det_y + 10),
-                cv2.FONT_HERSHEY_SIMPLEX,
+                font,
                 0.4, (0, 255, 0), 1
             )
     
     return vis
 
 
-def draw_question_rois(image: np.ndarray, template) -> np.ndarray:
-    """Draw ROI boxes for all questions."""
-    vis = image.copy()
-    if len(vis.shape) == 2:
-        vis = cv2.cvtColor(vis, cv2.COLOR_GRAY2BGR)
-    
-    for question in template.questions:
-        # Get bubble positions
-        positions = [(pos.x, pos.y) for pos in question.options.values()]
-        if not positions:
-            continue
-        
-        # Calculate bounding box
-        xs = [p[0] for p in positions]
-        ys = [p[1] for p in positions]
-        x1, y1 = min(xs) - 20, min(ys) - 20
-        x2, y2 = max(xs) + 20, max(ys) + 20
+def draw_question_rois(
+    image: np.ndarray,
+    template,
+    out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Draw ROI boxes for all questions on a BGR image (into out if given)."""
+    vis = _draw_target(image, out)
+    
+    radius = template.bubble_config.radius
+    table = get_bubble_table(template)
+    starts = table.q_offsets.tolist()
+    centers = np.stack([table.xs, table.ys], axis=1)
+    
+    # Per-question min/max over contiguous runs; questions without options stay zero
+    counts = np.diff(table.q_offsets)
+    has_options = counts > 0
+    question_bboxes = np.zeros((len(counts), 4), dtype=np.int32)
+    if has_options.any():
+        run_starts = table.q_offsets[:-1][has_options]
+        question_bboxes[has_options, :2] = np.minimum.reduceat(centers, run_starts)
+        question_bboxes[has_options, 2:] = np.maximum.reduceat(centers, run_starts)
+    padded = question_bboxes + np.array([-20, -20, 20, 20], dtype=np.int32)
+    bboxes = padded.tolist()
+    
+    # Only questions with bubbles whose box (or the label just above it) touches the image
+    img_h, img_w = vis.shape[:2]
+    x1s, y1s, x2s, y2s = padded.T
+    visible = (
+        has_options
+        & (x2s >= 0) & (y2s >= 0) & (x1s < img_w) & (y1s - 20 < img_h)
+    )
+    
+    # Box color by question range: 1-15 green, 16-30 orange, rest blue
+    questions = template.questions
+    ids = np.array([q.question_id for q in questions], dtype=np.int32)[:, None]
+    colors = np.where(
+        ids <= 15, (0, 255, 0), np.where(ids <= 30, (255, 165, 0), (0, 165, 255))
+    ).tolist()
+    
+    for i in np.flatnonzero(visible).tolist():
+        question = questions[i]
+        start, end = starts[i], starts[i + 1]
+        x1, y1, x2, y2 = bboxes[i]
+        color = colors[i]
         
         # Draw box
-        color = (0, 255, 0) if question.question_id <= 15 else \
-                (255, 165, 0) if question.question_id <= 30 else \
-                (0, 165, 255)
         cv2.rectangle(vis, (x1, y1), (x2, y2), color, 1)
         
         # Draw question number
@@ -169,11 +213,11 @@ def draw_question_rois(image: np.ndarray, template) -> np.ndarray:
         )
         
         # Draw bubble circles
-        for option, pos in question.options.items():
-            cv2.circle(vis, (pos.x, pos.y), template.bubble_config.radius, (200, 200, 200), 1)
+        for option, (x, y) in zip(question.options, centers[start:end].tolist()):
+            cv2.circle(vis, (x, y), radius, (200, 200, 200), 1)
             cv2.putText(
                 vis, option,
-                (pos.x - 4, pos.y + 4),
+                (x - 4, y + 4),
                 cv2.FONT_HERSHEY_SIMPLEX,
                 0.3, (0, 0, 0), 1
             )
@@ -181,6 +225,30 @@ def draw_question_rois(image: np.ndarray, template) -> np.ndarray:
     return vis
 
 
+TITLE_HEIGHT = 61  # title bar covers rows 0-60 of each stage
+
+
+@lru_cache(maxsize=None)
+def title_strip(title: str, width: int) -> np.ndarray:
+    """White title bar with black text, rendered once per (title, width)."""
+    strip = np.full((TITLE_HEIGHT, width, 3), 255, dtype=np.uint8)
+    cv2.putText(
+        strip, title,
+        (20, 40),
+        cv2.FONT_HERSHEY_SIMPLEX,
+        1.2, (0, 0, 0), 2
+    )
+    strip.flags.writeable = False
+    return strip
+
+
+def to_bgr(image: np.ndarray) -> np.ndarray:
+    """BGR version of image in a new buffer, safe to draw on in place."""
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    return image.copy()
+
+
 def create_alignment_visualization(image_path: Path, template_id: str, output_path: Path):
     """Create comprehensive alignment visualization."""
     logger.info(f"Processing: {image_path}")
@@ -192,12 +260,15 @@ def create_alignment_visualization(image_path: Path, template_id: str, output_pa
     # Stage 1: Preprocess
     logger.info("Stage 1: Preprocessing...")
     preprocessed, _ = preprocess_image(str(image_path))
+    preprocessed_bgr = to_bgr(preprocessed)
     
     # Stage 2: Detect paper boundary
     logger.info("Stage 2: Paper detection...")
     try:
         boundary = detect_paper_boundary(preprocessed)
-        vis_boundary = draw_paper_boundary(preprocessed, boundary)
+        # Draw into a copy: if perspective correction raises below, the
+        # fallback panel starts from the clean preprocessed image
+        vis_boundary = draw_paper_boundary(preprocessed_bgr, boundary)
         
         # Stage 3: Perspective correction
         logger.info("Stage 3: Perspective correction...")
@@ -220,9 +291,7 @@ def create_alignment_visualization(image_path: Path, template_id: str, output_pa
             corrected = preprocessed
         
         # Create a simple boundary visualization (entire image)
-        vis_boundary = preprocessed.copy()
-        if len(vis_boundary.shape) == 2:
-            vis_boundary = cv2.cvtColor(vis_boundary, cv2.COLOR_GRAY2BGR)
+        vis_boundary = preprocessed_bgr
         h, w = vis_boundary.shape[:2]
         cv2.rectangle(vis_boundary, (0, 0), (w-1, h-1), (0, 255, 0), 3)
         cv2.putText(
@@ -250,57 +319,63 @@ def create_alignment_visualization(image_path: Path, template_id: str, output_pa
     
     logger.info(f"Alignment success: {alignment_success}")
     
-    # Create visualizations
-    vis_marks_before = draw_registration_marks_detailed(corrected, template, detected_marks)
-    vis_marks_after = draw_registration_marks_detailed(aligned, template, None)
-    vis_rois = draw_question_rois(aligned, template)
+    # Create visualizations. Each image is converted to BGR once and drawn on
+    # in place; only the aligned image, which feeds two stages, is copied.
+    corrected_bgr = to_bgr(corrected)
+    aligned_bgr = to_bgr(aligned)
+    vis_marks_before = draw_registration_marks_detailed(
+        corrected_bgr, template, detected_marks, out=corrected_bgr
+    )
+    vis_marks_after = draw_registration_marks_detailed(aligned_bgr, template, None)
+    vis_rois = draw_question_rois(aligned_bgr, template, out=aligned_bgr)
     
-    # Resize all to same width for stacking
+    # Resize all to same width, straight into one preallocated output canvas
     target_width = 1400
-    def resize_to_width(img, width):
-        h, w = img.shape[:2]
-        scale = width / w
-        return cv2.resize(img, (width, int(h * scale)))
+    stages = [vis_boundary, vis_marks_before, vis_marks_after, vis_rois]
+    heights = [int(img.shape[0] * (target_width / img.shape[1])) for img in stages]
+    output = np.empty((sum(heights), target_width, 3), dtype=np.uint8)
     
-    vis_boundary = resize_to_width(vis_boundary, target_width)
-    vis_marks_before = resize_to_width(vis_marks_before, target_width)
-    vis_marks_after = resize_to_width(vis_marks_after, target_width)
-    vis_rois = resize_to_width(vis_rois, target_width)
+    def resize_into(img, dst):
+        # Area averaging for the usual downscale keeps 1px ROI lines from aliasing away
+        interpolation = cv2.INTER_AREA if dst.shape[1] < img.shape[1] else cv2.INTER_LINEAR
+        cv2.resize(img, (dst.shape[1], dst.shape[0]), dst=dst, interpolation=interpolation)
+        return dst
     
-    # Add titles
-    def add_title(img, title):
-        img = img.copy()
-        cv2.rectangle(img, (0, 0), (img.shape[1], 60), (255, 255, 255), -1)
-        cv2.putText(
-            img, title,
-            (20, 40),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            1.2, (0, 0, 0), 2
-        )
-        return img
+    # Each stage becomes a row-slice view of the canvas (no vstack copy)
+    y_bounds = np.cumsum([0] + heights).tolist()
+    vis_boundary, vis_marks_before, vis_marks_after, vis_rois = [
+        resize_into(img, output[y0:y1])
+        for img, y0, y1 in zip(stages, y_bounds[:-1], y_bounds[1:])
+    ]
     
-    vis_boundary = add_title(vis_boundary, "1. Original + Paper Boundary")
-    vis_marks_before = add_title(vis_marks_before, "2. After Perspective Correction + Registration Marks")
-    vis_marks_after = add_title(vis_marks_after, "3. After Fine Alignment")
-    vis_rois = add_title(vis_rois, "4. Question ROI Boxes")
+    # Add titles (one prebuilt strip copied over the top rows of each slice)
+    def add_title(img, title):
+        img[:TITLE_HEIGHT] = title_strip(title, img.shape[1])
     
-    # Stack vertically
-    output = np.vstack([vis_boundary, vis_marks_before, vis_marks_after, vis_rois])
+    add_title(vis_boundary, "1. Original + Paper Boundary")
+    add_title(vis_marks_before, "2. After Perspective Correction + Registration Marks")
+    add_title(vis_marks_after, "3. After Fine Alignment")
+    add_title(vis_rois, "4. Question ROI Boxes")
     
-    # Save
+    # Save the stacked view and the individual stages
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    cv2.imwrite(str(output_path), output)
-    logger.success(f"Visualization saved: {output_path}")
-    
-    # Also save individual stages
     stage_dir = output_path.parent / f"{output_path.stem}_stages"
     stage_dir.mkdir(exist_ok=True)
     
-    cv2.imwrite(str(stage_dir / "1_boundary.png"), vis_boundary)
-    cv2.imwrite(str(stage_dir / "2_marks_detected.png"), vis_marks_before)
-    cv2.imwrite(str(stage_dir / "3_aligned.png"), vis_marks_after)
-    cv2.imwrite(str(stage_dir / "4_rois.png"), vis_rois)
+    # Stage images are contiguous row views of the canvas, not separate buffers
+    writes = [
+        (output_path, output),
+        (stage_dir / "1_boundary.png", vis_boundary),
+        (stage_dir / "2_marks_detected.png", vis_marks_before),
+        (stage_dir / "3_aligned.png", vis_marks_after),
+        (stage_dir / "4_rois.png", vis_rois),
+    ]
     
+    # PNG encoding releases the GIL, so the five files encode concurrently
+    with ThreadPoolExecutor(max_workers=len(writes)) as executor:
+        list(executor.map(lambda job: cv2.imwrite(str(job[0]), job[1]), writes))
+    
+    logger.success(f"Visualization saved: {output_path}")
     logger.success(f"Individual stages saved: {stage_dir}")
 
 
@@ -44,13 +44,25 @@ Example:
         --image tests/fixtures/images/test_perfect_form_60q.png
         --template form_60q
         --output tests/output/debug_60q
+
+    /
+
+    # Only render the alignment and fill scoring stages
+    python -m tests.debug.visualize_pipeline
+        --image tests/fixtures/images/test_perfect_form_60q.png
+        --template form_60q
+        --output tests/output/debug_60q
+        --stages align,score
 """
 import argparse
+import os
 import sys
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 import cv2
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from loguru import logger
 
 # Add parent directories to path
@@ -62,30 +74,64 @@ from app.pipeline.perspective import correct_perspective
 from app.pipeline.align import align_image_with_template
 from app.pipeline.roi_extraction import extract_all_bubbles
 from app.pipeline.fill_scoring import score_all_questions
-from app.templates.loader import load_template
+from app.templates.loader import get_bubble_table, load_template
 from app.utils.visualization import (
     draw_paper_boundary,
     create_pipeline_stages_grid
 )
 
 
+# Stage keys accepted by --stages, in pipeline order
+STAGE_KEYS = ("preprocess", "paper", "perspective", "align", "roi", "score")
+
+
+def _thumbnail(image: np.ndarray, max_side: int) -> np.ndarray:
+    """Downscale image so its long side is at most max_side pixels."""
+    h, w = image.shape[:2]
+    scale = max_side / max(h, w)
+    if scale >= 1:
+        return image
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def _disc_offsets(radius: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(dy, dx) pixel offsets covered by a filled cv2.circle of the given radius."""
+    stamp = np.zeros((2 * radius + 1, 2 * radius + 1), dtype=np.uint8)
+    cv2.circle(stamp, (radius, radius), radius, 1, -1)
+    dys, dxs = np.nonzero(stamp)
+    return dys - radius, dxs - radius
+
+
 class PipelineVisualizer:
     """Runs pipeline with visualization at each stage."""
     
-    def __init__(self, image_path: str, template_id: str, output_dir: str):
+    def __init__(self, image_path: str, template_id: str, output_dir: str,
+                 draw_text: bool = True, stages: Optional[Iterable[str]] = None):
         self.image_path = Path(image_path)
         self.template_id = template_id
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.draw_text = draw_text
+        self._enabled_stages = set(stages) if stages else set(STAGE_KEYS)
+        self._io_pool: Optional[ThreadPoolExecutor] = None
+        self._pending_writes: List[Tuple[Path, Optional[Future]]] = []
         
         self.stages: List[Dict[str, Any]] = []
         self.template = None
+        self._bubble_table = None
+        self._bubble_meta: List[Tuple[int, str]] = []
+        self._bubble_centers = np.empty((0, 2), dtype=np.int32)
+        self._bubble_boxes = np.empty((0, 4, 2), dtype=np.int32)
         
     def run(self) -> bool:
         """Execute pipeline with visualization."""
         logger.info(f"Starting visualization for: {self.image_path}")
         logger.info(f"Output directory: {self.output_dir}")
         
+        # Stage PNGs encode in the background (cv2.imwrite releases the GIL)
+        # while the following stages run
+        self._io_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
         try:
             # Load template
             self._stage_load_template()
@@ -124,11 +170,63 @@ class PipelineVisualizer:
         except Exception as e:
             logger.error(f"Visualization failed: {e}")
             return False
+        finally:
+            self._io_pool.shutdown(wait=True)
+            self._io_pool = None
+    
+    def _add_stage(self, stage: Dict[str, Any]):
+        """Record a stage and start writing its image to the output directory."""
+        self.stages.append(stage)
+        output_path = self.output_dir / f"{stage['name']}.png"
+        if self._io_pool is None:
+            # Called outside run(): write synchronously
+            cv2.imwrite(str(output_path), stage['image'])
+            self._pending_writes.append((output_path, None))
+        else:
+            future = self._io_pool.submit(cv2.imwrite, str(output_path), stage['image'])
+            self._pending_writes.append((output_path, future))
+    
+    @staticmethod
+    def _to_bgr(img: np.ndarray) -> np.ndarray:
+        """Return a fresh BGR copy of img (cvtColor already allocates for grayscale)."""
+        if img.ndim == 2:
+            return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        return img.copy()
+    
+    def _put_lines(self, img: np.ndarray, lines: List[Tuple], origin: Tuple[int, int] = (10, 30)):
+        """
+        Draw a block of status text lines.
+        
+        Args:
+            lines: (dy, text, scale, color, thickness) per line; dy is the
+                   offset from the previous line (the first is drawn at origin)
+        """
+        if not self.draw_text:
+            return
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        x, y = origin
+        for dy, text, scale, color, thickness in lines:
+            y += dy
+            cv2.putText(img, text, (x, y), font, scale, color, thickness)
     
     def _stage_load_template(self):
         """Load template."""
         logger.info("📋 Loading template...")
         self.template = load_template(self.template_id)
+        
+        # Flattened bubble positions (built once per template by the loader)
+        # so the drawing stages don't walk the template per visualization
+        self._bubble_table = get_bubble_table(self.template)
+        self._bubble_meta = list(zip(self._bubble_table.question_ids.tolist(),
+                                     self._bubble_table.options.tolist()))
+        self._bubble_centers = np.stack([self._bubble_table.xs, self._bubble_table.ys], axis=1)
+        # Square ROI outline per bubble as a closed (TL, TR, BR, BL) polygon
+        radius = self.template.bubble_config.radius
+        corner_offsets = np.array(
+            [[-radius, -radius], [radius, -radius], [radius, radius], [-radius, radius]],
+            dtype=np.int32
+        )
+        self._bubble_boxes = self._bubble_centers[:, None, :] + corner_offsets
         logger.info(f"  Template: {self.template.template_id}")
         logger.info(f"  Questions: {len(self.template.questions)}")
         logger.info(f"  Registration marks: {len(self.template.registration_marks)}")
@@ -137,31 +235,37 @@ class PipelineVisualizer:
         """Stage 1: Preprocessing (with all intermediate stages)."""
         logger.info("🔧 Stage 1: Preprocessing (Detailed)")
         
-        # Convert path with forward slashes for cv2.imread compatibility
-        image_path_str = str(self.image_path).replace('\\', '/')
+        # Read the file ourselves and decode from memory (cv2.imread cannot
+        # open non-ASCII paths on Windows)
+        try:
+            raw = self.image_path.read_bytes()
+        except OSError as e:
+            logger.error(f"  ❌ Failed to read image from: {self.image_path} ({e})")
+            return None, {}
         
-        # Try to load image
-        original = cv2.imread(image_path_str)
+        original = cv2.imdecode(np.frombuffer(raw, dtype=np.uint8), cv2.IMREAD_COLOR)
         if original is None:
-            logger.error(f"  ❌ Failed to load image from: {image_path_str}")
-            logger.error(f"  File exists: {self.image_path.exists()}")
+            logger.error(f"  ❌ Failed to decode image from: {self.image_path}")
             return None, {}
         
-        # Get preprocessing with all intermediates
+        # Get preprocessing with all intermediates (reuses the decoded image)
         preprocessed, metrics, intermediates = preprocess_image(
-            str(self.image_path),
+            original,
             return_intermediates=True
         )
+        logger.info(f"  Blur: {metrics['blur_score']:.1f}, Brightness: {metrics['brightness_mean']:.1f}, Skew: {metrics['skew_angle']:.2f}°")
+        if "preprocess" not in self._enabled_stages:
+            return preprocessed, metrics
         
         # Stage 1a: Original Image (no overlay - keep pristine)
-        self.stages.append({
+        self._add_stage({
             'name': '1a_original',
             'title': 'Stage 1a: Original Image',
             'image': original.copy(),
         })
         
         # Stage 1b: Grayscale Conversion (no overlay - show raw grayscale)
-        self.stages.append({
+        self._add_stage({
             'name': '1b_grayscale',
             'title': 'Stage 1b: Grayscale Conversion',
             'image': cv2.cvtColor(intermediates['grayscale'], cv2.COLOR_GRAY2BGR),
@@ -169,7 +273,7 @@ class PipelineVisualizer:
         
         # Stage 1c: CLAHE Enhancement (no overlay - show raw CLAHE)
         if intermediates['clahe'] is not None:
-            self.stages.append({
+            self._add_stage({
                 'name': '1c_clahe',
                 'title': 'Stage 1c: CLAHE Enhancement',
                 'image': cv2.cvtColor(intermediates['clahe'], cv2.COLOR_GRAY2BGR),
@@ -181,55 +285,42 @@ class PipelineVisualizer:
             brightness_std = metrics.get('brightness_std', 50)
             method = "Adaptive Gaussian" if brightness_std < 40 else "Otsu"
             
-            self.stages.append({
+            self._add_stage({
                 'name': '1d_binary',
                 'title': f'Stage 1d: Binarization ({method})',
                 'image': cv2.cvtColor(intermediates['binary'], cv2.COLOR_GRAY2BGR),
             })
         
         # Stage 1e: Quality Metrics Summary
-        metrics_img = preprocessed.copy()
-        if len(metrics_img.shape) == 2:
-            metrics_img = cv2.cvtColor(metrics_img, cv2.COLOR_GRAY2BGR)
-        
-        y_offset = 30
-        cv2.putText(metrics_img, "Quality Metrics:", (10, y_offset),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
-        y_offset += 40
-        cv2.putText(metrics_img, f"Blur Score: {metrics['blur_score']:.1f}", 
-                    (10, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-        y_offset += 30
-        cv2.putText(metrics_img, f"Brightness: {metrics['brightness_mean']:.1f} +/- {metrics['brightness_std']:.1f}", 
-                    (10, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-        y_offset += 30
-        cv2.putText(metrics_img, f"Skew: {metrics['skew_angle']:.2f} degrees", 
-                    (10, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+        metrics_img = self._to_bgr(preprocessed)
         
         # Add quality assessments
-        y_offset += 40
         if metrics['blur_score'] >= 100:
-            cv2.putText(metrics_img, "Blur: GOOD", (10, y_offset),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+            blur_line = ("Blur: GOOD", (0, 255, 0))
         else:
-            cv2.putText(metrics_img, "Blur: WARNING", (10, y_offset),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 165, 255), 2)
-        y_offset += 30
-        
+            blur_line = ("Blur: WARNING", (0, 165, 255))
         if 80 <= metrics['brightness_mean'] <= 200:
-            cv2.putText(metrics_img, "Brightness: GOOD", (10, y_offset),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+            brightness_line = ("Brightness: GOOD", (0, 255, 0))
         else:
-            cv2.putText(metrics_img, "Brightness: WARNING", (10, y_offset),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 165, 255), 2)
-        
-        self.stages.append({
+            brightness_line = ("Brightness: WARNING", (0, 165, 255))
+        
+        self._put_lines(metrics_img, [
+            (0, "Quality Metrics:", 0.8, (0, 255, 255), 2),
+            (40, f"Blur Score: {metrics['blur_score']:.1f}", 0.6, (0, 255, 0), 2),
+            (30, f"Brightness: {metrics['brightness_mean']:.1f} +/- {metrics['brightness_std']:.1f}",
+             0.6, (0, 255, 0), 2),
+            (30, f"Skew: {metrics['skew_angle']:.2f} degrees", 0.6, (0, 255, 0), 2),
+            (40, blur_line[0], 0.6, blur_line[1], 2),
+            (30, brightness_line[0], 0.6, brightness_line[1], 2),
+        ])
+        
+        self._add_stage({
             'name': '1e_metrics',
             'title': 'Stage 1e: Quality Metrics',
             'image': metrics_img,
             'metrics': metrics
         })
         
-        logger.info(f"  Blur: {metrics['blur_score']:.1f}, Brightness: {metrics['brightness_mean']:.1f}, Skew: {metrics['skew_angle']:.2f}°")
         return preprocessed, metrics
     
     def _stage_paper_detection(self, image: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
@@ -252,46 +343,42 @@ class PipelineVisualizer:
             ], dtype=np.float32)
             is_valid = False
         
-        # Visualize with detailed contour info
-        vis_img = image.copy()
-        if len(vis_img.shape) == 2:
-            vis_img = cv2.cvtColor(vis_img, cv2.COLOR_GRAY2BGR)
-        
-        vis_img = draw_paper_boundary(vis_img, boundary)
-        
-        # Calculate and display boundary info
+        # Calculate boundary info
         h, w = image.shape[:2]
         img_area = h * w
         
         # Calculate boundary area using contour
         boundary_area = cv2.contourArea(boundary)
         coverage = (boundary_area / img_area) * 100
+        logger.info(f"  Boundary: {len(boundary)} corners, {coverage:.1f}% coverage")
+        if "paper" not in self._enabled_stages:
+            return boundary, None
+        
+        # Visualize with detailed contour info
+        vis_img = self._to_bgr(image)
+        
+        vis_img = draw_paper_boundary(vis_img, boundary)
         
         # Add detailed status
-        y_offset = 30
         status = "✓ Paper Detected" if is_valid else "⚠ Using Fallback"
         color = (0, 255, 0) if is_valid else (0, 165, 255)
-        cv2.putText(vis_img, status, (10, y_offset), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
-        
-        y_offset += 35
-        cv2.putText(vis_img, f"Coverage: {coverage:.1f}%", (10, y_offset),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-        
-        y_offset += 30
-        cv2.putText(vis_img, f"Corners: {len(boundary)} points", (10, y_offset),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+        self._put_lines(vis_img, [
+            (0, status, 0.8, color, 2),
+            (35, f"Coverage: {coverage:.1f}%", 0.6, (0, 255, 0), 2),
+            (30, f"Corners: {len(boundary)} points", 0.6, (0, 255, 0), 2),
+        ])
         
         # Draw corner labels
         if len(boundary) == 4:
-            labels = ["TL", "TR", "BR", "BL"]
-            for i, (point, label) in enumerate(zip(boundary, labels)):
-                x, y = int(point[0]), int(point[1])
+            corners = boundary.reshape(4, 2).astype(np.int32).tolist()
+            for x, y in corners:
                 cv2.circle(vis_img, (x, y), 10, (255, 0, 255), -1)
-                cv2.putText(vis_img, label, (x + 15, y + 5),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 255), 2)
+            if self.draw_text:
+                for (x, y), label in zip(corners, ["TL", "TR", "BR", "BL"]):
+                    cv2.putText(vis_img, label, (x + 15, y + 5),
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 255), 2)
         
-        self.stages.append({
+        self._add_stage({
             'name': '2_paper_detection',
             'title': 'Stage 2: Paper Detection',
             'image': vis_img,
@@ -299,7 +386,6 @@ class PipelineVisualizer:
             'coverage': coverage
         })
         
-        logger.info(f"  Boundary: {len(boundary)} corners, {coverage:.1f}% coverage")
         return boundary, vis_img
     
     def _stage_perspective_correction(self, image: np.ndarray, boundary: np.ndarray) -> np.ndarray:
@@ -313,22 +399,21 @@ class PipelineVisualizer:
             logger.error("  ❌ Perspective correction failed")
             return None
         
-        # Add dimensions text
-        vis_img = corrected.copy()
-        if len(vis_img.shape) == 2:
-            vis_img = cv2.cvtColor(vis_img, cv2.COLOR_GRAY2BGR)
-        
         h, w = corrected.shape[:2]
-        cv2.putText(vis_img, f"Size: {w}x{h}", (10, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+        logger.info(f"  Corrected to: {w}x{h}")
+        if "perspective" not in self._enabled_stages:
+            return corrected
         
-        self.stages.append({
+        # Add dimensions text
+        vis_img = self._to_bgr(corrected)
+        self._put_lines(vis_img, [(0, f"Size: {w}x{h}", 0.6, (0, 255, 0), 2)])
+        
+        self._add_stage({
             'name': '3_perspective_corrected',
             'title': 'Stage 3: Perspective Corrected',
             'image': vis_img
         })
         
-        logger.info(f"  Corrected to: {w}x{h}")
         return corrected
     
     def _stage_alignment(self, image: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
@@ -350,61 +435,62 @@ class PipelineVisualizer:
             aligned = image.copy()
             alignment_successful = False
         
+        if "align" not in self._enabled_stages:
+            return aligned, None
+        
         # Visualize with registration mark details
-        vis_img = image.copy()
-        if len(vis_img.shape) == 2:
-            vis_img = cv2.cvtColor(vis_img, cv2.COLOR_GRAY2BGR)
+        vis_img = self._to_bgr(image)
+        
+        # Search windows around every expected mark position (clipped to the image)
+        marks = self.template.registration_marks
+        xs = np.array([mark.position.x for mark in marks], dtype=np.int32)
+        ys = np.array([mark.position.y for mark in marks], dtype=np.int32)
+        search_radii = 2 * np.array([mark.size for mark in marks], dtype=np.int32)
+        x1s = np.maximum(0, xs - search_radii)
+        x2s = np.minimum(image.shape[1], xs + search_radii)
+        y1s = np.maximum(0, ys - search_radii)
+        y2s = np.minimum(image.shape[0], ys + search_radii)
+        has_roi = (y2s > y1s) & (x2s > x1s)
+        
+        # Simple detection: a dark window means the mark is present
+        mark_means = self._window_means(image, x1s, y1s, x2s, y2s)
+        detected = (has_roi & (mark_means < 100)).tolist()
         
         # Draw expected registration mark positions
         detected_count = 0
-        for mark in self.template.registration_marks:
+        for i, mark in enumerate(marks):
             x, y = mark.position.x, mark.position.y
             size = mark.size
             
             # Draw expected position (yellow circle)
             cv2.circle(vis_img, (x, y), size, (0, 255, 255), 2)
             
-            # Try to detect if mark is actually present
-            # Extract ROI around expected position
-            search_radius = int(size * 2)
-            y1, y2 = max(0, y - search_radius), min(image.shape[0], y + search_radius)
-            x1, x2 = max(0, x - search_radius), min(image.shape[1], x + search_radius)
-            
-            if y2 > y1 and x2 > x1:
-                roi = image[y1:y2, x1:x2]
-                # Simple detection: check for dark region
-                mean_val = np.mean(roi)
-                is_detected = mean_val < 100  # Dark region
-                
-                if is_detected:
+            if has_roi[i]:
+                if detected[i]:
                     # Green checkmark for detected
                     cv2.circle(vis_img, (x, y), size // 2, (0, 255, 0), -1)
                     detected_count += 1
                     label_color = (0, 255, 0)
                 else:
                     # Red X for not detected
-                    cv2.line(vis_img, (x - size//2, y - size//2), (x + size//2, y + size//2), (0, 0, 255), 2)
-                    cv2.line(vis_img, (x + size//2, y - size//2), (x - size//2, y + size//2), (0, 0, 255), 2)
+                    cv2.drawMarker(vis_img, (x, y), (0, 0, 255), markerType=cv2.MARKER_TILTED_CROSS,
+                                   markerSize=size, thickness=2)
                     label_color = (0, 0, 255)
                 
                 # Mark label
-                cv2.putText(vis_img, mark.id[:2].upper(), (x + size + 5, y + 5),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, label_color, 2)
+                if self.draw_text:
+                    cv2.putText(vis_img, mark.id[:2].upper(), (x + size + 5, y + 5),
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, label_color, 2)
         
         # Status overlay
-        y_offset = 30
-        cv2.putText(vis_img, status_text, (10, y_offset),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-        
-        y_offset += 35
-        cv2.putText(vis_img, f"Registration Marks: {detected_count}/{len(self.template.registration_marks)}", 
-                    (10, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-        
-        y_offset += 30
-        cv2.putText(vis_img, f"Mark Size: {self.template.registration_marks[0].size}px", 
-                    (10, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-        
-        self.stages.append({
+        self._put_lines(vis_img, [
+            (0, status_text, 0.8, (0, 255, 0), 2),
+            (35, f"Registration Marks: {detected_count}/{len(self.template.registration_marks)}",
+             0.6, (0, 255, 0), 2),
+            (30, f"Mark Size: {self.template.registration_marks[0].size}px", 0.6, (0, 255, 0), 2),
+        ])
+        
+        self._add_stage({
             'name': '4_aligned',
             'title': 'Stage 4: Template Alignment',
             'image': vis_img,
@@ -415,82 +501,86 @@ class PipelineVisualizer:
         logger.info(f"  Marks detected: {detected_count}/{len(self.template.registration_marks)}")
         return aligned, vis_img
     
+    @staticmethod
+    def _window_means(image: np.ndarray, x1s: np.ndarray, y1s: np.ndarray,
+                      x2s: np.ndarray, y2s: np.ndarray) -> np.ndarray:
+        """Mean intensity of each image[y1:y2, x1:x2] window (NaN for empty ones)."""
+        widths = x2s - x1s
+        heights = y2s - y1s
+        if len(widths) and (widths == widths[0]).all() and (heights == heights[0]).all() \
+                and widths[0] > 0 and heights[0] > 0:
+            # Equal-sized windows: gather them all at once and reduce in one call
+            windows = sliding_window_view(image, (int(heights[0]), int(widths[0])), axis=(0, 1))
+            stacked = windows[y1s, x1s].reshape(len(widths), -1)
+            return stacked.mean(axis=1)
+        
+        return np.array([
+            cv2.mean(image[y1:y2, x1:x2])[0] if y2 > y1 and x2 > x1 else np.nan
+            for x1, y1, x2, y2 in zip(x1s.tolist(), y1s.tolist(), x2s.tolist(), y2s.tolist())
+        ])
+    
     def _stage_roi_extraction(self, image: np.ndarray) -> Tuple[Dict, np.ndarray]:
         """Stage 5: ROI extraction."""
         logger.info("✂️ Stage 5: ROI Extraction")
         
         bubbles = extract_all_bubbles(image, self.template)
         
-        # Visualize - draw rectangles around extracted regions with color coding
-        vis_img = image.copy()
-        if len(vis_img.shape) == 2:
-            vis_img = cv2.cvtColor(vis_img, cv2.COLOR_GRAY2BGR)
-        
-        total_rois = 0
-        successful_rois = 0
-        failed_rois = 0
-        
-        # bubbles is Dict[question_id, Dict[option, roi_image]]
-        for question_id, question_bubbles in bubbles.items():
-            # Find the corresponding question in template to get positions
-            question_template = next((q for q in self.template.questions if q.question_id == question_id), None)
-            if question_template is None:
+        # bubbles is Dict[question_id, Dict[option, roi_image]]; mark which
+        # template bubbles were extracted and which came back non-empty
+        n_bubbles = len(self._bubble_meta)
+        extracted = np.zeros(n_bubbles, dtype=bool)
+        roi_ok = np.zeros(n_bubbles, dtype=bool)
+        for i, (question_id, option) in enumerate(self._bubble_meta):
+            question_bubbles = bubbles.get(question_id)
+            if question_bubbles is None or option not in question_bubbles:
                 continue
-            
-            for option, roi_image in question_bubbles.items():
-                total_rois += 1
-                
-                try:
-                    # Get position from template
-                    if option in question_template.options:
-                        pos = question_template.options[option]
-                        # Handle Position object with x, y attributes
-                        if hasattr(pos, 'x') and hasattr(pos, 'y'):
-                            x, y = int(pos.x), int(pos.y)
-                        else:
-                            x, y = int(pos[0]), int(pos[1])
-                        
-                        radius = self.template.bubble_config.radius
-                        
-                        # Color code based on extraction success
-                        if roi_image is not None and roi_image.size > 0:
-                            color = (0, 255, 0)  # Green for successful
-                            successful_rois += 1
-                        else:
-                            color = (0, 0, 255)  # Red for failed
-                            failed_rois += 1
-                        
-                        # Draw square ROI
-                        cv2.rectangle(vis_img, 
-                                    (x - radius, y - radius),
-                                    (x + radius, y + radius),
-                                    color, 1)
-                        
-                        # Draw center point
-                        cv2.circle(vis_img, (x, y), 2, (255, 0, 0), -1)
-                        
-                        # Draw question number for first option
-                        if option == 'A':
-                            cv2.putText(vis_img, f"Q{question_id}", (x + radius + 5, y),
-                                       cv2.FONT_HERSHEY_SIMPLEX, 0.3, (255, 255, 255), 1)
-                except Exception as e:
-                    logger.debug(f"Error drawing ROI for Q{question_id}{option}: {e}")
+            roi_image = question_bubbles[option]
+            extracted[i] = True
+            roi_ok[i] = roi_image is not None and roi_image.size > 0
+        
+        total_rois = int(extracted.sum())
+        successful_rois = int(roi_ok.sum())
+        failed_rois = total_rois - successful_rois
+        logger.info(f"  Extracted {successful_rois}/{total_rois} bubble ROIs successfully")
+        if "roi" not in self._enabled_stages:
+            return bubbles, None
+        
+        # Visualize - draw rectangles around extracted regions with color coding
+        vis_img = self._to_bgr(image)
+        
+        # Draw question number for first option (under the ROI squares drawn next)
+        if self.draw_text:
+            radius = self.template.bubble_config.radius
+            for i in np.flatnonzero(extracted).tolist():
+                question_id, option = self._bubble_meta[i]
+                if option == 'A':
+                    x, y = self._bubble_centers[i].tolist()
+                    cv2.putText(vis_img, f"Q{question_id}", (x + radius + 5, y),
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.3, (255, 255, 255), 1)
+        
+        # Draw square ROIs, one polylines call per color:
+        # green for successful, red for failed
+        for mask, color in ((roi_ok, (0, 255, 0)), (extracted & ~roi_ok, (0, 0, 255))):
+            if mask.any():
+                cv2.polylines(vis_img, self._bubble_boxes[mask], True, color, 1)
+        
+        # Draw center points by stamping a radius-2 disc at every center
+        dys, dxs = _disc_offsets(2)
+        centers = self._bubble_centers[extracted]
+        ys = (centers[:, 1, None] + dys).ravel()
+        xs = (centers[:, 0, None] + dxs).ravel()
+        inside = (ys >= 0) & (ys < vis_img.shape[0]) & (xs >= 0) & (xs < vis_img.shape[1])
+        vis_img[ys[inside], xs[inside]] = (255, 0, 0)
         
         # Status overlay
-        y_offset = 30
-        cv2.putText(vis_img, f"Total ROIs: {total_rois}", (10, y_offset),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-        y_offset += 30
-        cv2.putText(vis_img, f"Successful: {successful_rois}", (10, y_offset),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-        y_offset += 30
-        cv2.putText(vis_img, f"Failed: {failed_rois}", (10, y_offset),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-        y_offset += 30
-        cv2.putText(vis_img, f"Radius: {self.template.bubble_config.radius}px", (10, y_offset),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-        
-        self.stages.append({
+        self._put_lines(vis_img, [
+            (0, f"Total ROIs: {total_rois}", 0.7, (255, 255, 255), 2),
+            (30, f"Successful: {successful_rois}", 0.6, (0, 255, 0), 2),
+            (30, f"Failed: {failed_rois}", 0.6, (0, 0, 255), 2),
+            (30, f"Radius: {self.template.bubble_config.radius}px", 0.6, (255, 255, 255), 2),
+        ])
+        
+        self._add_stage({
             'name': '5_roi_extraction',
             'title': 'Stage 5: ROI Extraction',
             'image': vis_img,
@@ -499,7 +589,6 @@ class PipelineVisualizer:
             'failed_rois': failed_rois
         })
         
-        logger.info(f"  Extracted {successful_rois}/{total_rois} bubble ROIs successfully")
         return bubbles, vis_img
     
     def _stage_fill_scoring(self, image: np.ndarray, bubbles: Dict) -> Tuple[List, np.ndarray]:
@@ -508,112 +597,93 @@ class PipelineVisualizer:
         
         detections = score_all_questions(bubbles, self.template.bubble_config)
         
-        # Visualize with detailed fill percentages
-        vis_img = image.copy()
-        if len(vis_img.shape) == 2:
-            vis_img = cv2.cvtColor(vis_img, cv2.COLOR_GRAY2BGR)
+        # Status per template question ('' when the question has no detection)
+        statuses = np.array([
+            detections[q.question_id].get('detection_status', 'unanswered')
+            if q.question_id in detections else ''
+            for q in self.template.questions
+        ], dtype=str)
+        scored_mask = statuses != ''
+        answered_mask = statuses == 'answered'
+        ambiguous_mask = statuses == 'ambiguous'
+        unanswered_mask = scored_mask & ~(answered_mask | ambiguous_mask)
         
         # Count statuses
-        answered = 0
-        unanswered = 0
-        ambiguous = 0
+        answered = int(np.count_nonzero(answered_mask))
+        unanswered = int(np.count_nonzero(unanswered_mask))
+        ambiguous = int(np.count_nonzero(ambiguous_mask))
         
-        # Track fill percentages for histogram
-        fill_percentages = []
+        logger.info(f"  Answered: {answered}, Unanswered: {unanswered}, Ambiguous: {ambiguous}")
+        if "score" not in self._enabled_stages:
+            return detections, None
+        
+        # Visualize with detailed fill percentages
+        vis_img = self._to_bgr(image)
+        
+        # Status code per question (0 no detection, 1 answered, 2 ambiguous,
+        # 3 anything else), spread to every bubble of that question
+        question_codes = np.select([answered_mask, ambiguous_mask, unanswered_mask], [1, 2, 3], 0)
+        codes = np.repeat(question_codes, np.diff(self._bubble_table.q_offsets))
+        drawn = codes > 0
+        
+        # Gather per-bubble selection and fill percentage (ratio * 100)
+        n_bubbles = len(self._bubble_meta)
+        selected = np.zeros(n_bubbles, dtype=bool)
+        fill_pcts = np.zeros(n_bubbles)
+        for i in np.flatnonzero(drawn).tolist():
+            question_id, option = self._bubble_meta[i]
+            detection_result = detections[question_id]
+            selected[i] = option in detection_result.get('selected', [])
+            fill_pcts[i] = detection_result.get('fill_ratios', {}).get(option, 0.0) * 100
+        
+        color_idx = np.where(selected, codes, 0)
+        fill_percentages = fill_pcts[drawn]
+        
+        # Palette indexed by color_idx: (circle color, thickness, text color)
+        palette = (
+            ((128, 128, 128), 1, (150, 150, 150)),  # Gray for not selected
+            ((0, 255, 0), 3, (255, 255, 255)),      # Green for selected in answered
+            ((0, 0, 255), 3, (255, 255, 255)),      # Red for ambiguous
+            ((0, 165, 255), 2, (255, 255, 255)),    # Orange
+        )
         
         # Draw bubble circles with status-based colors and fill percentages
-        for question_id, detection_result in detections.items():
-            # Find the template question
-            template_q = next((q for q in self.template.questions if q.question_id == question_id), None)
-            if not template_q:
-                continue
-            
-            # Get overall status for this question
-            status = detection_result.get('detection_status', 'unanswered')
-            fill_ratios = detection_result.get('fill_ratios', {})
-            selected_options = detection_result.get('selected', [])
+        radius = self.template.bubble_config.radius
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        font_scale = 0.35
+        centers = self._bubble_centers.tolist()
+        for i in np.flatnonzero(drawn).tolist():
+            x, y = centers[i]
+            color, thickness, text_color = palette[color_idx[i]]
+            cv2.circle(vis_img, (x, y), radius, color, thickness)
             
-            # Update counters based on question status
-            if status == 'answered':
-                answered += 1
-            elif status == 'ambiguous':
-                ambiguous += 1
-            else:
-                unanswered += 1
-            
-            # Draw each bubble option
-            for option in template_q.options.keys():
-                if option in template_q.options:
-                    pos = template_q.options[option]
-                    x = int(pos.x) if hasattr(pos, 'x') else int(pos[0])
-                    y = int(pos.y) if hasattr(pos, 'y') else int(pos[1])
-                    
-                    # Get fill percentage for this option (ratio * 100)
-                    fill_ratio = fill_ratios.get(option, 0.0)
-                    fill_pct = fill_ratio * 100
-                    fill_percentages.append(fill_pct)
-                    
-                    # Determine color based on whether this option is selected
-                    if option in selected_options:
-                        if status == 'answered':
-                            color = (0, 255, 0)  # Green for selected in answered
-                            thickness = 3
-                        elif status == 'ambiguous':
-                            color = (0, 0, 255)  # Red for ambiguous
-                            thickness = 3
-                        else:
-                            color = (0, 165, 255)  # Orange
-                            thickness = 2
-                    else:
-                        color = (128, 128, 128)  # Gray for not selected
-                        thickness = 1
-                    
-                    # Draw circle for bubble
-                    radius = self.template.bubble_config.radius
-                    cv2.circle(vis_img, (x, y), radius, color, thickness)
-                    
-                    # Draw fill percentage text for ALL bubbles to show detection working
-                    text = f"{fill_pct:.0f}%"
-                    # Position text outside the circle
-                    text_x = x + radius + 5
-                    text_y = y + 5
-                    font_scale = 0.35
-                    text_color = (255, 255, 255) if option in selected_options else (150, 150, 150)
-                    cv2.putText(vis_img, text, (text_x, text_y),
-                               cv2.FONT_HERSHEY_SIMPLEX, font_scale, text_color, 1)
-        
-        # Status overlay with detailed stats
-        y_offset = 30
-        cv2.putText(vis_img, "Detection Results:", (10, y_offset),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-        y_offset += 35
-        cv2.putText(vis_img, f"Answered: {answered}", (10, y_offset),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-        y_offset += 30
-        cv2.putText(vis_img, f"Unanswered: {unanswered}", (10, y_offset),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 165, 255), 2)
-        y_offset += 30
-        cv2.putText(vis_img, f"Ambiguous: {ambiguous}", (10, y_offset),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-        
-        # Add threshold info
-        y_offset += 40
+            # Draw fill percentage text for ALL bubbles to show detection working,
+            # positioned outside the circle
+            if self.draw_text:
+                cv2.putText(vis_img, f"{fill_pcts[i]:.0f}%", (x + radius + 5, y + 5),
+                           font, font_scale, text_color, 1)
+        
+        # Status overlay with detailed stats and threshold info
         threshold = self.template.bubble_config.fill_threshold
-        cv2.putText(vis_img, f"Threshold: {threshold}%", (10, y_offset),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        lines = [
+            (0, "Detection Results:", 0.7, (255, 255, 255), 2),
+            (35, f"Answered: {answered}", 0.6, (0, 255, 0), 2),
+            (30, f"Unanswered: {unanswered}", 0.6, (0, 165, 255), 2),
+            (30, f"Ambiguous: {ambiguous}", 0.6, (0, 0, 255), 2),
+            (40, f"Threshold: {threshold}%", 0.5, (255, 255, 255), 1),
+        ]
         
         # Add fill percentage stats
-        if fill_percentages:
-            avg_fill = np.mean(fill_percentages)
-            max_fill = np.max(fill_percentages)
-            y_offset += 25
-            cv2.putText(vis_img, f"Avg Fill: {avg_fill:.1f}%", (10, y_offset),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-            y_offset += 25
-            cv2.putText(vis_img, f"Max Fill: {max_fill:.1f}%", (10, y_offset),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        
-        self.stages.append({
+        if fill_percentages.size:
+            avg_fill = fill_percentages.mean()
+            max_fill = fill_percentages.max()
+            lines += [
+                (25, f"Avg Fill: {avg_fill:.1f}%", 0.5, (255, 255, 255), 1),
+                (25, f"Max Fill: {max_fill:.1f}%", 0.5, (255, 255, 255), 1),
+            ]
+        self._put_lines(vis_img, lines)
+        
+        self._add_stage({
             'name': '6_fill_scoring',
             'title': 'Stage 6: Fill Scoring & Detection',
             'image': vis_img,
@@ -623,24 +693,29 @@ class PipelineVisualizer:
             'ambiguous': ambiguous
         })
         
-        logger.info(f"  Answered: {answered}, Unanswered: {unanswered}, Ambiguous: {ambiguous}")
         return detections, vis_img
     
     def _save_all_stages(self):
-        """Save individual stage images."""
+        """Wait for the individual stage images queued by _add_stage."""
         logger.info("💾 Saving stage images...")
         
-        for stage in self.stages:
-            output_path = self.output_dir / f"{stage['name']}.png"
-            cv2.imwrite(str(output_path), stage['image'])
+        for output_path, future in self._pending_writes:
+            if future is not None:
+                future.result()
             logger.info(f"  Saved: {output_path.name}")
+        self._pending_writes.clear()
     
     def _create_summary_grid(self):
         """Create grid view of all stages."""
         logger.info("📸 Creating summary grid...")
         
-        # Prepare stages as list of (title, image) tuples
-        stages = [(stage['title'], stage['image']) for stage in self.stages]
+        if not self.stages:
+            logger.warning("  No stages rendered, skipping grid")
+            return
+        
+        # Prepare stages as list of (title, image) tuples, downscaled so the
+        # grid is built from thumbnails rather than full-resolution copies
+        stages = [(stage['title'], _thumbnail(stage['image'], 800)) for stage in self.stages]
         
         try:
             # Use 4 columns for better layout with more stages
@@ -659,14 +734,26 @@ def main():
     parser.add_argument("--image", required=True, help="Path to input image")
     parser.add_argument("--template", required=True, help="Template ID (e.g., form_A)")
     parser.add_argument("--output", required=True, help="Output directory for debug images")
+    parser.add_argument("--no-text", action="store_true",
+                       help="Skip text overlays (useful when timing the pipeline)")
+    parser.add_argument("--stages",
+                       help=f"Comma-separated stages to render (default: all): {','.join(STAGE_KEYS)}")
     
     args = parser.parse_args()
     
+    stages = None
+    if args.stages:
+        stages = [name.strip() for name in args.stages.split(",") if name.strip()]
+        unknown = sorted(set(stages) - set(STAGE_KEYS))
+        if unknown:
+            parser.error(f"unknown stage(s): {', '.join(unknown)}")
+    
     # Configure logging
     logger.remove()
     logger.add(sys.stderr, level="INFO")
     
-    visualizer = PipelineVisualizer(args.image, args.template, args.output)
+    visualizer = PipelineVisualizer(args.image, args.template, args.output,
+                                    draw_text=not args.no_text, stages=stages)
     success = visualizer.run()
     
     sys.exit(0 if success else 1)
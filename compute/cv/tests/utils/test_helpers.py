@@ -3,6 +3,7 @@ Test helper utilities.
 
 Provides common functions for test setup, fixture loading, and validation.
 """
+import os
 from pathlib import Path
 from typing import Dict, Any, List
 import json
@@ -76,13 +77,15 @@ def list_test_images() -> List[str]:
     if not images_dir.exists():
         return []
     
-    extensions = ["*.jpg", "*.png", "*.jpeg"]
-    image_files = []
-    
-    for ext in extensions:
-        image_files.extend([f.name for f in images_dir.glob(ext)])
-    
-    return sorted(image_files)
+    # One directory scan, classifying entries by extension; hidden files
+    # such as macOS "._foo.png" resource forks are not images
+    extensions = (".jpg", ".png", ".jpeg")
+    with os.scandir(images_dir) as entries:
+        return sorted(
+            entry.name for entry in entries
+            if not entry.name.startswith(".")
+            and entry.name.endswith(extensions) and entry.is_file()
+        )
 
 
 def ensure_output_dir(test_name: str) -> Path:
@@ -139,9 +142,9 @@ def compare_images(img1: np.ndarray, img2: np.ndarray,
     if len(img2.shape) == 3:
         img2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
     
-    # Calculate structural similarity
-    diff = cv2.absdiff(img1, img2)
-    similarity = 1.0 - (np.sum(diff) / (img1.shape[0] * img1.shape[1] * 255))
+    # Calculate structural similarity (L1 norm = sum of absolute differences)
+    diff_sum = cv2.norm(img1, img2, cv2.NORM_L1)
+    similarity = 1.0 - (diff_sum / (img1.shape[0] * img1.shape[1] * 255))
     
     return similarity >= threshold
 